@@ -1,9 +1,15 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Header, Query
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from tokenizer import AdvancedWordTokenizer
+from profiling import Profiler, instrument, stage
+import json
+import os
 import re
+import secrets
+import sys
 
 app = FastAPI(
     title="Tokenizer API",
@@ -78,6 +84,34 @@ class DecodeResponse(BaseModel):
     success: bool
     error: Optional[str] = None
 
+class ProfileRequest(BaseModel):
+    text: str
+    top: int = 15
+
+class StageTiming(BaseModel):
+    calls: int
+    seconds: float
+    alloc_count: Optional[int] = None
+    alloc_bytes: Optional[int] = None
+    peak_bytes: Optional[int] = None
+
+class Hotspot(BaseModel):
+    function: str
+    calls: int
+    tottime: float
+    cumtime: float
+
+class AllocationSite(BaseModel):
+    location: str
+    size_bytes: int
+    count: int
+
+class ProfileResponse(BaseModel):
+    total_seconds: float
+    stages: Dict[str, StageTiming]
+    hotspots: List[Hotspot]
+    allocations: List[AllocationSite]
+
 # API Endpoints
 @app.get("/")
 async def root():
@@ -94,11 +128,26 @@ async def root():
         }
     }
 
-@app.post("/api/tokenize", response_model=TokenizeResponse)
-async def tokenize(request: TokenizeRequest):
-    """Tokenize input text and return tokens with IDs"""
-    text = request.text
-    
+def classify_tokens(tokens: List[str], ids: List[int], unk_id: int) -> List[str]:
+    """Assign a display type to each token"""
+    token_types = []
+    for token, token_id in zip(tokens, ids):
+        token_type = 'normal'
+        if token_id == unk_id:
+            token_type = 'unknown'
+        elif re.match(r'^[^\w\s]+$', token):
+            token_type = 'punctuation'
+        elif re.match(r'^\d+', token):
+            token_type = 'number'
+        elif "'" in token:
+            token_type = 'contraction'
+        elif '-' in token:
+            token_type = 'hyphenated'
+        token_types.append(token_type)
+    return token_types
+
+def build_tokenize_response(text: str) -> TokenizeResponse:
+    """Run the tokenize pipeline and build the response model"""
     if not text.strip():
         return TokenizeResponse(
             tokens=[],
@@ -126,26 +175,11 @@ async def tokenize(request: TokenizeRequest):
     compression_ratio = round(len(text) / len(tokens), 2) if tokens else 0
     
     # Create token details with types
-    token_details = []
-    for i, (token, token_id) in enumerate(zip(tokens, ids)):
-        token_type = 'normal'
-        if token_id == unk_id:
-            token_type = 'unknown'
-        elif re.match(r'^[^\w\s]+$', token):
-            token_type = 'punctuation'
-        elif re.match(r'^\d+', token):
-            token_type = 'number'
-        elif "'" in token:
-            token_type = 'contraction'
-        elif '-' in token:
-            token_type = 'hyphenated'
-        
-        token_details.append(TokenDetail(
-            token=token,
-            id=token_id,
-            type=token_type,
-            index=i
-        ))
+    token_types = classify_tokens(tokens, ids, unk_id)
+    token_details = [
+        TokenDetail(token=token, id=token_id, type=token_type, index=i)
+        for i, (token, token_id, token_type) in enumerate(zip(tokens, ids, token_types))
+    ]
     
     return TokenizeResponse(
         tokens=tokens,
@@ -161,6 +195,15 @@ async def tokenize(request: TokenizeRequest):
         )
     )
 
+# Profiling stages, only hooked in while a Profiler is active
+instrument(sys.modules[__name__], 'classify_tokens', 'classification')
+instrument(sys.modules[__name__], 'build_tokenize_response', 'response_build')
+
+@app.post("/api/tokenize", response_model=TokenizeResponse)
+async def tokenize(request: TokenizeRequest):
+    """Tokenize input text and return tokens with IDs"""
+    return build_tokenize_response(request.text)
+
 @app.get("/api/vocab/stats", response_model=VocabStatsResponse)
 async def vocab_stats():
     """Get vocabulary statistics"""
@@ -226,6 +269,54 @@ async def decode(request: DecodeRequest):
     except Exception as e:
         return DecodeResponse(decoded="", success=False, error=str(e))
 
+def profile_request(text: str, profiler: Profiler) -> Profiler:
+    """Run one tokenize request, including JSON encoding, under a profiler"""
+    with profiler:
+        response = build_tokenize_response(text)
+        with stage('serialization'):
+            json.dumps(jsonable_encoder(response))
+    return profiler
+
+@app.post("/api/admin/profile", response_model=ProfileResponse)
+async def profile(
+    request: ProfileRequest,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Profile a sample tokenize request and return stage timings and hotspots"""
+    # Endpoint is disabled unless an admin token is configured
+    admin_token = os.environ.get('TOKENIZER_ADMIN_TOKEN')
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    
+    if not request.text.strip():
+        return ProfileResponse(total_seconds=0, stages={}, hotspots=[], allocations=[])
+    
+    # Separate passes so cProfile and tracemalloc don't skew the timings
+    top = max(1, min(request.top, 100))
+    timing = profile_request(request.text, Profiler(top=top)).report()
+    hotspots = profile_request(request.text, Profiler(use_cprofile=True, top=top)).hotspots()
+    memory = profile_request(request.text, Profiler(trace_memory=True, top=top)).report()
+    
+    stages = {}
+    for name, entry in timing['stages'].items():
+        memory_entry = memory['stages'].get(name, {})
+        stages[name] = StageTiming(
+            calls=entry['calls'],
+            seconds=entry['seconds'],
+            alloc_count=memory_entry.get('alloc_count'),
+            alloc_bytes=memory_entry.get('alloc_bytes'),
+            peak_bytes=memory_entry.get('peak_bytes')
+        )
+    
+    return ProfileResponse(
+        total_seconds=timing['total_seconds'],
+        stages=stages,
+        hotspots=hotspots,
+        allocations=memory['allocations']
+    )
+
 if __name__ == '__main__':
     import uvicorn
     print("\n" + "="*60)
@@ -0,0 +1,293 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+
+from tokenizer import AdvancedWordTokenizer
+
+# Profiler collecting stage timings for the current context (None = disabled)
+_active = ContextVar('tokenizer_profiler', default=None)
+_NULL_STAGE = nullcontext()
+
+# Registered hooks: (owner, attribute, stage name)
+_hooks = []
+_hooks_lock = threading.Lock()
+_hooks_depth = 0
+_originals = []
+
+# tracemalloc is process-wide, so only stop it once the last user is done
+_tracemalloc_depth = 0
+_tracemalloc_owned = False
+
+# Traces from the profiler itself are excluded from every report
+_SELF_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__)
+]
+
+
+class _Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.wall_start = time.perf_counter()
+        self.parent = self.profiler._current
+        self.profiler._current = self
+        self.child_seconds = 0.0
+        if self.profiler.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.parent is not None:
+                # reset_peak() below would otherwise hide the parent's peak so far
+                self.parent.child_peak = max(self.parent.child_peak, peak)
+            self.mem_snapshot = tracemalloc.take_snapshot().filter_traces(_SELF_FILTERS)
+            self.mem_start = tracemalloc.get_traced_memory()[0]
+            self.child_peak = 0
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        memory = None
+        if self.profiler.trace_memory:
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            snapshot = tracemalloc.take_snapshot().filter_traces(_SELF_FILTERS)
+            diffs = snapshot.compare_to(self.mem_snapshot, 'lineno')
+            memory = (
+                sum(max(0, stat.count_diff) for stat in diffs),
+                sum(max(0, stat.size_diff) for stat in diffs),
+                max(0, peak - self.mem_start)
+            )
+            if self.parent is not None:
+                self.parent.child_peak = max(self.parent.child_peak, peak)
+            # Drop the snapshots so they don't count towards the parent's peak
+            del snapshot, diffs
+            self.mem_snapshot = None
+            tracemalloc.reset_peak()
+        self.profiler._current = self.parent
+        if self.parent is not None:
+            self.parent.child_seconds += time.perf_counter() - self.wall_start
+        # Record self time so nested stages are not counted twice
+        self.profiler._record(self.name, elapsed - self.child_seconds, memory)
+        return False
+
+
+def stage(name):
+    """Time a named stage if a Profiler is active, otherwise do nothing"""
+    profiler = _active.get()
+    if profiler is None:
+        return _NULL_STAGE
+    return _Stage(profiler, name)
+
+
+def profiled(name):
+    """Decorator form of stage()"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument(owner, attr, name):
+    """
+    Register owner.attr to be timed as stage `name`.
+
+    The wrapper is only installed while a Profiler is active, so the
+    original function runs untouched when profiling is disabled.
+    """
+    _hooks.append((owner, attr, name))
+
+
+def _install_hooks():
+    global _hooks_depth
+    with _hooks_lock:
+        _hooks_depth += 1
+        if _hooks_depth > 1:
+            return
+        for owner, attr, name in _hooks:
+            original = getattr(owner, attr)
+            _originals.append((owner, attr, original))
+            setattr(owner, attr, profiled(name)(original))
+
+
+def _remove_hooks():
+    global _hooks_depth
+    with _hooks_lock:
+        _hooks_depth -= 1
+        if _hooks_depth > 0:
+            return
+        while _originals:
+            owner, attr, original = _originals.pop()
+            setattr(owner, attr, original)
+
+
+def _acquire_tracemalloc():
+    global _tracemalloc_depth, _tracemalloc_owned
+    with _hooks_lock:
+        _tracemalloc_depth += 1
+        if _tracemalloc_depth == 1:
+            _tracemalloc_owned = not tracemalloc.is_tracing()
+            if _tracemalloc_owned:
+                tracemalloc.start()
+
+
+def _release_tracemalloc():
+    global _tracemalloc_depth, _tracemalloc_owned
+    with _hooks_lock:
+        _tracemalloc_depth -= 1
+        if _tracemalloc_depth == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+class Profiler:
+    """
+    Opt-in profiler for tokenizer internals.
+
+    Usage:
+        with Profiler(trace_memory=True) as prof:
+            tokenizer.encode(text)
+        print(prof.report())
+
+    Stage timings are always collected and exclude time spent in nested
+    stages. With trace_memory, each stage also reports the blocks and
+    bytes it allocated that were still live when it finished, and its
+    peak memory above the starting point (both include nested stages).
+    cProfile hotspots are collected only when use_cprofile is set.
+
+    Memory tracing takes snapshots around every stage, which inflates
+    cProfile's cumulative times, so prefer separate runs for the two.
+    """
+
+    def __init__(self, use_cprofile=False, trace_memory=False, top=15):
+        self.use_cprofile = use_cprofile
+        self.trace_memory = trace_memory
+        self.top = top
+        self.stages = {}
+        self.total_time = 0.0
+        self._current = None
+        self._cprofile = None
+        self._start_snapshot = None
+        self._end_snapshot = None
+        self._cleanup = None
+        self._token = None
+
+    def _record(self, name, elapsed, memory):
+        entry = self.stages.setdefault(name, {
+            'calls': 0,
+            'seconds': 0.0,
+            'alloc_count': 0,
+            'alloc_bytes': 0,
+            'peak_bytes': 0
+        })
+        entry['calls'] += 1
+        entry['seconds'] += elapsed
+        if memory is not None:
+            count, size, peak = memory
+            entry['alloc_count'] += count
+            entry['alloc_bytes'] += size
+            entry['peak_bytes'] = max(entry['peak_bytes'], peak)
+
+    def __enter__(self):
+        # Undo any global changes if a later setup step fails
+        with ExitStack() as cleanup:
+            if self.trace_memory:
+                _acquire_tracemalloc()
+                cleanup.callback(_release_tracemalloc)
+                self._start_snapshot = tracemalloc.take_snapshot().filter_traces(_SELF_FILTERS)
+            _install_hooks()
+            cleanup.callback(_remove_hooks)
+            if self.use_cprofile:
+                self._cprofile = cProfile.Profile()
+                self._cprofile.enable()
+            self._cleanup = cleanup.pop_all()
+        self._token = _active.set(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.total_time = time.perf_counter() - self._start
+        _active.reset(self._token)
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        try:
+            if self.trace_memory:
+                self._end_snapshot = tracemalloc.take_snapshot().filter_traces(_SELF_FILTERS)
+        finally:
+            self._cleanup.close()
+        return False
+
+    def hotspots(self):
+        """Top functions by cumulative time from cProfile"""
+        if self._cprofile is None:
+            return []
+        stats = pstats.Stats(self._cprofile, stream=io.StringIO())
+        stats.sort_stats('cumulative')
+        results = []
+        for func in stats.fcn_list:
+            filename, line, func_name = func
+            # Skip the profiler's own wrappers
+            if filename in (__file__, tracemalloc.__file__):
+                continue
+            prim_calls, calls, tottime, cumtime, _ = stats.stats[func]
+            results.append({
+                'function': f"{filename}:{line}({func_name})",
+                'calls': calls,
+                'tottime': round(tottime, 6),
+                'cumtime': round(cumtime, 6)
+            })
+            if len(results) >= self.top:
+                break
+        return results
+
+    def allocations(self):
+        """Top allocation sites made while the profiler was active"""
+        if self._end_snapshot is None:
+            return []
+        diffs = [
+            stat for stat in self._end_snapshot.compare_to(self._start_snapshot, 'lineno')
+            if stat.size_diff or stat.count_diff
+        ]
+        results = []
+        for stat in diffs[:self.top]:
+            frame = stat.traceback[0]
+            results.append({
+                'location': f"{frame.filename}:{frame.lineno}",
+                'size_bytes': stat.size_diff,
+                'count': stat.count_diff
+            })
+        return results
+
+    def report(self):
+        """Summarize stage timings, hotspots and allocations as a dict"""
+        stages = {}
+        for name, entry in self.stages.items():
+            stages[name] = {
+                'calls': entry['calls'],
+                'seconds': round(entry['seconds'], 6),
+                # None means memory was not traced, not that nothing was allocated
+                'alloc_count': entry['alloc_count'] if self.trace_memory else None,
+                'alloc_bytes': entry['alloc_bytes'] if self.trace_memory else None,
+                'peak_bytes': entry['peak_bytes'] if self.trace_memory else None
+            }
+        return {
+            'total_seconds': round(self.total_time, 6),
+            'stages': stages,
+            'hotspots': self.hotspots(),
+            'allocations': self.allocations()
+        }
+
+
+instrument(AdvancedWordTokenizer, 'tokenize_text', 'regex_scan')
+instrument(AdvancedWordTokenizer, 'encode', 'vocab_lookup')
+instrument(AdvancedWordTokenizer, 'decode', 'decode')
@@ -0,0 +1,213 @@
+import os
+import threading
+import tracemalloc
+
+import pytest
+
+import profiling
+from profiling import Profiler, stage
+from tokenizer import AdvancedWordTokenizer
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """FastAPI test client (the app loads its vocab relative to backend/)"""
+    from fastapi.testclient import TestClient
+    monkeypatch.chdir(BACKEND_DIR)
+    import app_fastapi
+    return TestClient(app_fastapi.app)
+
+
+def test_stage_records_nothing_without_profiler():
+    assert profiling._active.get() is None
+    with stage('regex_scan') as ctx:
+        pass
+    assert ctx is None
+
+
+def test_disabled_path_runs_original_methods():
+    original_encode = AdvancedWordTokenizer.encode
+    original_decode = AdvancedWordTokenizer.decode
+    with Profiler():
+        assert AdvancedWordTokenizer.decode is not original_decode
+    assert AdvancedWordTokenizer.encode is original_encode
+    assert AdvancedWordTokenizer.decode is original_decode
+
+
+def test_nested_stages_record_self_time():
+    with Profiler() as prof:
+        with stage('outer'):
+            with stage('inner'):
+                sum(range(100000))
+    stages = prof.report()['stages']
+    assert stages['outer']['calls'] == 1
+    assert stages['inner']['calls'] == 1
+    assert stages['outer']['seconds'] < stages['inner']['seconds']
+
+
+def test_exception_in_stage_is_recorded_and_resets_profiler():
+    original_decode = AdvancedWordTokenizer.decode
+    with pytest.raises(ValueError):
+        with Profiler() as prof:
+            with stage('failing'):
+                raise ValueError('boom')
+    assert prof.stages['failing']['calls'] == 1
+    assert profiling._active.get() is None
+    assert AdvancedWordTokenizer.decode is original_decode
+
+
+def test_tokenizer_stages():
+    tokenizer = AdvancedWordTokenizer()
+    tokenizer.word2idx = {tokenizer.PAD: 0, tokenizer.UNK: 1, 'hello': 4, ',': 5, 'world': 6}
+    tokenizer.idx2word = {idx: word for word, idx in tokenizer.word2idx.items()}
+    with Profiler(trace_memory=True) as prof:
+        ids = tokenizer.encode('Hello, world!')
+        tokenizer.decode(ids)
+    assert set(prof.stages) == {'regex_scan', 'vocab_lookup', 'decode'}
+
+
+def test_stage_memory_not_reported_without_tracing():
+    with Profiler() as prof:
+        with stage('work'):
+            pass
+    entry = prof.report()['stages']['work']
+    assert entry['alloc_count'] is None
+    assert entry['alloc_bytes'] is None
+    assert entry['peak_bytes'] is None
+
+
+def test_stage_memory_is_never_negative():
+    kept = []
+    with Profiler(trace_memory=True) as prof:
+        with stage('outer'):
+            with stage('inner'):
+                temp = [str(i) for i in range(10000)]
+            kept.append([str(i) for i in range(100)])
+            del temp
+    stages = prof.report()['stages']
+    for entry in stages.values():
+        assert entry['alloc_count'] >= 0
+        assert entry['alloc_bytes'] >= 0
+        assert entry['peak_bytes'] >= 0
+    assert stages['inner']['alloc_count'] >= 10000
+    assert stages['outer']['peak_bytes'] >= stages['inner']['peak_bytes']
+    assert stages['outer']['alloc_count'] >= 100
+
+
+def test_failed_setup_restores_global_state(monkeypatch):
+    class FailingProfile:
+        def enable(self):
+            raise ValueError('Another profiling tool is already active')
+
+    monkeypatch.setattr(profiling.cProfile, 'Profile', FailingProfile)
+    original_decode = AdvancedWordTokenizer.decode
+    was_tracing = tracemalloc.is_tracing()
+    with pytest.raises(ValueError):
+        with Profiler(use_cprofile=True, trace_memory=True):
+            pass
+    assert AdvancedWordTokenizer.decode is original_decode
+    assert profiling._hooks_depth == 0
+    assert profiling._tracemalloc_depth == 0
+    assert tracemalloc.is_tracing() == was_tracing
+    assert profiling._active.get() is None
+
+
+def test_overlapping_profilers_share_tracemalloc():
+    first_entered = threading.Event()
+    second_entered = threading.Event()
+    first_exited = threading.Event()
+
+    def first():
+        with Profiler(trace_memory=True):
+            first_entered.set()
+            second_entered.wait()
+        first_exited.set()
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    first_entered.wait()
+    with Profiler(trace_memory=True) as prof:
+        second_entered.set()
+        first_exited.wait()
+        assert tracemalloc.is_tracing()
+        with stage('work'):
+            data = [str(i) for i in range(1000)]
+    thread.join()
+    assert prof.report()['stages']['work']['alloc_count'] >= 1000
+    assert not tracemalloc.is_tracing()
+    del data
+
+
+def test_hotspots_exclude_profiler_wrappers():
+    tokenizer = AdvancedWordTokenizer()
+    tokenizer.word2idx = {tokenizer.PAD: 0, tokenizer.UNK: 1, 'hello': 4}
+    tokenizer.idx2word = {idx: word for word, idx in tokenizer.word2idx.items()}
+    with Profiler(use_cprofile=True, trace_memory=True, top=50) as prof:
+        tokenizer.decode(tokenizer.encode('hello there'))
+    functions = [hotspot['function'] for hotspot in prof.hotspots()]
+    assert functions
+    assert not any(f.startswith(profiling.__file__ + ':') for f in functions)
+
+
+def test_admin_profile_disabled_without_token(client, monkeypatch):
+    monkeypatch.delenv('TOKENIZER_ADMIN_TOKEN', raising=False)
+    response = client.post('/api/admin/profile', json={'text': 'hello'})
+    assert response.status_code == 404
+
+
+def test_admin_profile_rejects_bad_token(client, monkeypatch):
+    monkeypatch.setenv('TOKENIZER_ADMIN_TOKEN', 'secret')
+    response = client.post('/api/admin/profile', json={'text': 'hello'})
+    assert response.status_code == 403
+    response = client.post(
+        '/api/admin/profile',
+        json={'text': 'hello'},
+        headers={'X-Admin-Token': 'wrong'}
+    )
+    assert response.status_code == 403
+
+
+def test_admin_profile_reports_stages(client, monkeypatch):
+    monkeypatch.setenv('TOKENIZER_ADMIN_TOKEN', 'secret')
+    response = client.post(
+        '/api/admin/profile',
+        json={'text': "I don't think it's state-of-the-art, 1,234.56!", 'top': 5},
+        headers={'X-Admin-Token': 'secret'}
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert set(report['stages']) == {
+        'regex_scan', 'vocab_lookup', 'decode',
+        'classification', 'response_build', 'serialization'
+    }
+    # The handler calls tokenize_text directly and again through encode
+    assert report['stages']['regex_scan']['calls'] == 2
+    assert report['stages']['serialization']['calls'] == 1
+    assert report['stages']['response_build']['calls'] == 1
+    assert 0 < len(report['hotspots']) <= 5
+    for entry in report['stages'].values():
+        assert entry['alloc_count'] >= 0
+        assert entry['alloc_bytes'] >= 0
+        assert entry['peak_bytes'] >= 0
+
+
+def test_admin_profile_blank_text(client, monkeypatch):
+    monkeypatch.setenv('TOKENIZER_ADMIN_TOKEN', 'secret')
+    response = client.post(
+        '/api/admin/profile',
+        json={'text': '   '},
+        headers={'X-Admin-Token': 'secret'}
+    )
+    assert response.status_code == 200
+    assert response.json()['stages'] == {}
+
+
+def test_tokenize_unchanged_after_profiling(client, monkeypatch):
+    monkeypatch.setenv('TOKENIZER_ADMIN_TOKEN', 'secret')
+    text = 'Hello, world!'
+    before = client.post('/api/tokenize', json={'text': text}).json()
+    client.post('/api/admin/profile', json={'text': text}, headers={'X-Admin-Token': 'secret'})
+    after = client.post('/api/tokenize', json={'text': text}).json()
+    assert before == after